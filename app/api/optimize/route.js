@@ -1,6 +1,72 @@
 // app/api/optimize/route.js
 import { NextResponse } from 'next/server';
 
+/**
+ * 最小ヒープ（優先度付きキュー）
+ *
+ * 要素は [勤務回数, スタッフID] の配列で、勤務回数が少ない順に取り出せる。
+ * 毎日全スタッフをソートし直すと O(S log S) × 日数 かかるが、
+ * ヒープなら1日に順位が変わるのは選ばれたスタッフだけなので
+ * O(k log S)（k = 採用人数）で済む。
+ */
+class MinHeap {
+  constructor(items = []) {
+    this.items = [...items];
+    // 後ろ半分の親ノードから順に沈めてヒープ化する（O(S)）
+    for (let i = Math.floor(this.items.length / 2) - 1; i >= 0; i--) {
+      this.siftDown(i);
+    }
+  }
+
+  get size() {
+    return this.items.length;
+  }
+
+  // [勤務回数, スタッフID] を辞書順で比較（回数が同じならIDで安定化）
+  less(a, b) {
+    return a[0] !== b[0] ? a[0] < b[0] : a[1] < b[1];
+  }
+
+  peek() {
+    return this.items[0];
+  }
+
+  push(item) {
+    this.items.push(item);
+    let i = this.items.length - 1;
+    while (i > 0) {
+      const parent = Math.floor((i - 1) / 2);
+      if (!this.less(this.items[i], this.items[parent])) break;
+      [this.items[i], this.items[parent]] = [this.items[parent], this.items[i]];
+      i = parent;
+    }
+  }
+
+  pop() {
+    const top = this.items[0];
+    const last = this.items.pop();
+    if (this.items.length > 0) {
+      this.items[0] = last;
+      this.siftDown(0);
+    }
+    return top;
+  }
+
+  siftDown(i) {
+    const n = this.items.length;
+    while (true) {
+      let smallest = i;
+      const left = 2 * i + 1;
+      const right = 2 * i + 2;
+      if (left < n && this.less(this.items[left], this.items[smallest])) smallest = left;
+      if (right < n && this.less(this.items[right], this.items[smallest])) smallest = right;
+      if (smallest === i) break;
+      [this.items[i], this.items[smallest]] = [this.items[smallest], this.items[i]];
+      i = smallest;
+    }
+  }
+}
+
 function optimizeShift(inputData) {
   const { staff: staffList = [], dates = [], constraints = {} } = inputData;
 
@@ -13,8 +79,10 @@ function optimizeShift(inputData) {
   }
 
   // 制約条件
+  // maxStaffは0未満にならないよう丸める（負の値が入るとヒープの
+  // 打ち切り判定やsliceが誤動作するため。0なら誰も割り当てず警告になる）
   const minStaff = constraints.min_staff_per_day ?? 1;
-  const maxStaff = constraints.max_staff_per_day ?? staffList.length;
+  const maxStaff = Math.max(0, constraints.max_staff_per_day ?? staffList.length);
 
   // 結果格納用
   const schedule = {};
@@ -34,28 +102,58 @@ function optimizeShift(inputData) {
     staffWorkCount[staffId] = 0;
   });
 
+  // 勤務回数をヒープで管理する
+  // 日をまたいで順位が変わるのは「その日選ばれたスタッフ」だけなので、
+  // 毎日ソートし直す代わりに、選ばれた分だけ回数+1で積み直す
+  const heap = new MinHeap(Object.keys(staffInfo).map(staffId => [0, staffId]));
+
   // 各日付に対してスタッフを割り当て
   for (const date of dates) {
-    const availableStaff = [];
-
-    for (const [staffId, info] of Object.entries(staffInfo)) {
-      if (info.unavailableDates.has(date)) continue;
-      if (staffWorkCount[staffId] >= info.maxDays) continue;
-
-      let score = staffWorkCount[staffId] * 10;
-      if (info.preferredDates.has(date)) score -= 100;
-
-      availableStaff.push({ id: staffId, score });
+    // その日の候補（希望日なら勤務回数から1引いたスコアで優先）
+    const candidates = [];
+    // その日NGだったスタッフ（順位は変わらないのであとでそのまま戻す）
+    const deferred = [];
+
+    while (heap.size > 0) {
+      if (maxStaff > 0 && candidates.length >= maxStaff) {
+        // 打ち切り判定：希望日ボーナスは最大1なので、ヒープ先頭の
+        // 勤務回数-1 が既に確保した maxStaff 番目のスコア以上なら
+        // これ以上取り出しても上位は入れ替わらない
+        const kthScore = candidates[maxStaff - 1].score;
+        if (heap.peek()[0] - 1 >= kthScore) break;
+      }
+
+      const [count, staffId] = heap.pop();
+      const info = staffInfo[staffId];
+
+      if (staffWorkCount[staffId] >= info.maxDays) continue; // 上限到達 → 以後も不要なので戻さない
+      if (info.unavailableDates.has(date)) {
+        deferred.push([count, staffId]);
+        continue;
+      }
+
+      const score = count - (info.preferredDates.has(date) ? 1 : 0);
+
+      // スコア順を保ったまま挿入（候補は高々 maxStaff+α 件なので安価）
+      let pos = candidates.length;
+      while (pos > 0 && candidates[pos - 1].score > score) pos--;
+      candidates.splice(pos, 0, { id: staffId, count, score });
     }
 
-    availableStaff.sort((a, b) => a.score - b.score);
-
-    let assignedCount = 0;
-    for (const { id: staffId } of availableStaff) {
-      if (assignedCount >= maxStaff) break;
+    // 上位 maxStaff 人を採用し、回数+1でヒープに戻す
+    const selected = candidates.slice(0, maxStaff);
+    for (const { id: staffId, count } of selected) {
       schedule[date].push(staffId);
       staffWorkCount[staffId]++;
-      assignedCount++;
+      heap.push([count + 1, staffId]);
+    }
+
+    // 採用されなかった候補とNGだったスタッフはそのまま戻す
+    for (const { id: staffId, count } of candidates.slice(maxStaff)) {
+      heap.push([count, staffId]);
+    }
+    for (const entry of deferred) {
+      heap.push(entry);
     }
   }
 
@@ -96,11 +194,17 @@ export async function POST(request) {
   }
 }
 
+// ヘルスチェックの内容は固定なので、リクエストごとにJSON化し直さず
+// モジュール読み込み時に一度だけ文字列化してウォーム起動間で使い回す
+const HEALTH_CHECK_BODY = JSON.stringify({
+  status: 'ok',
+  message: 'Shift optimization API is running',
+  version: '2.0.0',
+  engine: 'javascript-heuristic',
+});
+
 export async function GET() {
-  return NextResponse.json({
-    status: 'ok',
-    message: 'Shift optimization API is running',
-    version: '2.0.0',
-    engine: 'javascript-heuristic',
+  return new NextResponse(HEALTH_CHECK_BODY, {
+    headers: { 'content-type': 'application/json' },
   });
 }
@@ -2,7 +2,6 @@
 # -*- coding: utf-8 -*-
 """
 シフト最適化スクリプト
-PuLPを使った線形計画法でシフトを自動生成する
 
 入力：JSON形式（標準入力）
   - スタッフ情報
@@ -11,67 +10,529 @@ PuLPを使った線形計画法でシフトを自動生成する
 
 出力：JSON形式（標準出力）
   - 最適化されたシフト
+
+デフォルトは貪欲法によるヒューリスティック。
+NumPyが入っている環境では日付ごとの割り当てを行列演算で一括計算するため、
+スタッフ数×日数が大きくても純Pythonのループよりずっと速い。
+NumPyが無い環境でも同じロジックの純Python版にフォールバックする。
+
+従来のPuLP（線形計画法）による最適化は optimize_shift_lp として残してあり、
+入力の mode に 'optimal' を指定したときだけ使われる。
+PuLPはCBCソルバーの起動だけで数百msかかりインポートも重いので、
+ヒューリスティックで十分なデフォルト経路では読み込まない。
 """
 
 import sys
 import json
-from pulp import LpProblem, LpVariable, LpMaximize, lpSum, value, LpStatus
+import heapq
+import hashlib
+from collections import OrderedDict
+
+try:
+    import numpy as np
+except ImportError:
+    # NumPyが無い環境では純Python版にフォールバック
+    np = None
+
+try:
+    from numba import njit
+except ImportError:
+    # Numbaが無い環境ではNumPy版（または純Python版）にフォールバック
+    njit = None
+
+try:
+    import orjson
+except ImportError:
+    # orjsonが無い環境では標準のjsonにフォールバック
+    orjson = None
+
+# デフォルトの勤務時間
+DEFAULT_START_TIME = '09:00'
+DEFAULT_END_TIME = '17:00'
+
+# 入力JSONのサイズ上限（256KB）
+# 読み込みやパースを始める前に弾くことで、巨大な入力による
+# メモリ圧迫やパース時間の暴走を防ぐ（数百人×数百日でも十分収まる）
+MAX_BODY_BYTES = 256 * 1024
+
+
+def _dumps_bytes(obj):
+    """
+    結果をJSONのバイト列に変換する
+
+    orjsonはC実装で標準のjsonより数倍速く、最初からUTF-8のバイト列を
+    返すので文字列→バイト列のエンコードし直しも発生しない。
+    無い環境では標準のjsonで同じバイト列を作る。
+
+    Args:
+        obj: JSONに変換するオブジェクト
+
+    Returns:
+        bytes: UTF-8エンコード済みのJSON
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+
+def _loads(data):
+    """
+    JSONのバイト列をパースする
+
+    orjsonはバイト列を直接受け取れるので、標準のjsonが内部で行う
+    UTF-8デコードのパスを1回分省ける。orjson.JSONDecodeError は
+    json.JSONDecodeError（と ValueError）のサブクラスなので、
+    呼び出し側のexcept節はどちらの実装でもそのまま機能する。
+
+    Args:
+        data (bytes): パースするJSON
+
+    Returns:
+        パース結果のオブジェクト
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _write_response(result):
+    """
+    結果を標準出力に書き出す
+
+    成功・エラーのどの経路でも必ずこのヘルパーを通すことで、
+    シリアライズと書き出しの処理を1か所にまとめる
+
+    Args:
+        result (dict): 出力する結果
+    """
+    sys.stdout.buffer.write(_dumps_bytes(result) + b'\n')
+
+
+if njit is not None:
+    # cache=True でコンパイル結果をディスクに保存する
+    # 初回呼び出しだけコンパイルに時間がかかるが、2回目以降
+    # （サーバーレスのウォーム起動を含む）はキャッシュが使われる
+    @njit(cache=True)
+    def _core_assign_njit(unavail, pref, max_days, k):
+        """
+        貪欲割り当てのコアループ（Numbaでコンパイルされる）
+
+        Pythonのまま書くとdictやsetの参照が大半を占めるが、
+        bool行列とintベクトルだけを使った単純なループにしてあるので
+        Numbaがそのままネイティブコードにコンパイルできる
+
+        Args:
+            unavail (ndarray): NG日のbool行列（日数×スタッフ数）
+            pref (ndarray): 希望日のbool行列（日数×スタッフ数）
+            max_days (ndarray): スタッフごとの最大勤務日数
+            k (int): 各日の最大配置人数
+
+        Returns:
+            ndarray: (日数×k) の割り当て行列。空きスロットは -1
+        """
+        num_dates, num_staff = unavail.shape
+        work_count = np.zeros(num_staff, dtype=np.int64)
+        taken = np.zeros(num_staff, dtype=np.bool_)
+        assignments = np.full((num_dates, k), -1, dtype=np.int64)
+
+        for d in range(num_dates):
+            # k人分、その日の最小スコアのスタッフを順に選ぶ（部分選択ソート）
+            for slot in range(k):
+                best = -1
+                best_score = 0.0
+                for i in range(num_staff):
+                    if taken[i] or unavail[d, i]:
+                        continue
+                    if work_count[i] >= max_days[i]:
+                        continue
+                    score = work_count[i] - (0.5 if pref[d, i] else 0.0)
+                    if best == -1 or score < best_score:
+                        best = i
+                        best_score = score
+                if best == -1:
+                    # もう割り当てられるスタッフがいない
+                    break
+                assignments[d, slot] = best
+                taken[best] = True
+                work_count[best] += 1
+
+            # その日に選んだ分のフラグをリセット
+            for slot in range(k):
+                if assignments[d, slot] >= 0:
+                    taken[assignments[d, slot]] = False
+
+        return assignments
+
+
+def _assign_greedy_np(dates, pref_sets, unavail_sets, max_days_list,
+                      max_staff_per_day):
+    """
+    NumPyによるベクトル化版の貪欲割り当て
+
+    NG日・希望日を bool 行列（日数×スタッフ数）に展開しておき、
+    日付ごとのスコア計算とtop-k選択を配列演算でまとめて行う。
+    np.argpartition は全体をソートせずに上位k件だけ取り出すので O(S) で済む。
+
+    Args:
+        dates (list): 対象日のリスト
+        pref_sets (list): スタッフインデックスごとの希望日のfrozenset
+        unavail_sets (list): スタッフインデックスごとのNG日のfrozenset
+        max_days_list (list): スタッフインデックスごとの最大勤務日数
+        max_staff_per_day (int): 各日の最大配置人数
+
+    Returns:
+        list: 日付インデックスごとの、割り当てたスタッフインデックスのリスト
+    """
+    num_dates = len(dates)
+    num_staff = len(pref_sets)
+
+    # 日付 → 行列インデックスの対応表
+    date_idx = {date: d for d, date in enumerate(dates)}
+
+    # NG日と希望日を bool 行列に展開
+    unavail = np.zeros((num_dates, num_staff), dtype=bool)
+    pref = np.zeros((num_dates, num_staff), dtype=bool)
+    for i in range(num_staff):
+        for date in unavail_sets[i]:
+            d = date_idx.get(date)
+            if d is not None:
+                unavail[d, i] = True
+        for date in pref_sets[i]:
+            d = date_idx.get(date)
+            if d is not None:
+                pref[d, i] = True
+
+    # 最大勤務日数のベクトル
+    max_days = np.array(max_days_list, dtype=np.int64)
+
+    # kは0以上に丸める（負の値のままだとargpartitionやスライスが
+    # 「後ろからk番目」と解釈してしまい、誰も割り当てないべき入力で
+    # ほぼ全員が割り当てられてしまう）
+    k = max(0, min(max_staff_per_day, num_staff))
+
+    if njit is not None:
+        # Numbaがあればコンパイル済みのコアループで一括計算
+        raw = _core_assign_njit(unavail, pref, max_days, k)
+        # -1 は空きスロットなので除いてリストに変換
+        return [[int(i) for i in row if i >= 0] for row in raw]
+
+    # 希望日ボーナスとNG日を1枚のバイアス行列に前計算しておく
+    # （希望日は-0.5、NG日はinf）。これで日付ごとのスコア計算は
+    # 「勤務回数 + バイアス行」の加算1回に融合され、astypeや
+    # bool→floatの変換が毎日走らなくなる
+    bias = np.where(
+        unavail, np.float32(np.inf), np.float32(-0.5) * pref
+    ).astype(np.float32)
+
+    # 勤務回数もfloat32で持てば毎日の型変換が不要
+    # （勤務日数程度の整数はfloat32で正確に表せる）
+    work_count = np.zeros(num_staff, dtype=np.float32)
+    max_days_f = max_days.astype(np.float32)
+
+    assignments = []
+
+    for d in range(num_dates):
+        # スコア＝勤務回数（少ない人を優先）、希望日なら0.5引いてさらに優先
+        scores = work_count + bias[d]
+        # 上限到達者は inf にして選ばれないようにする（NG日はバイアスで処理済み）
+        scores[work_count >= max_days_f] = np.inf
+
+        if k < num_staff:
+            # 上位k件だけ部分選択（全体ソートは不要）
+            selected = np.argpartition(scores, k)[:k]
+        else:
+            selected = np.arange(num_staff)
+
+        # inf（＝割り当て不可）が混ざっていたら除外
+        selected = selected[np.isfinite(scores[selected])]
+
+        work_count[selected] += 1
+        assignments.append(selected.tolist())
+
+    return assignments
+
+
+def _assign_greedy_py(dates, pref_sets, unavail_sets, max_days_list,
+                      max_staff_per_day):
+    """
+    純Python版の貪欲割り当て（NumPyが無い環境用のフォールバック）
+
+    各日について、勤務回数が少ないスタッフを優先しつつ
+    希望日のスタッフにはボーナスを付けてソートし、上位から割り当てる。
+
+    Args:
+        dates (list): 対象日のリスト
+        pref_sets (list): スタッフインデックスごとの希望日のfrozenset
+        unavail_sets (list): スタッフインデックスごとのNG日のfrozenset
+        max_days_list (list): スタッフインデックスごとの最大勤務日数
+        max_staff_per_day (int): 各日の最大配置人数
+
+    Returns:
+        list: 日付インデックスごとの、割り当てたスタッフインデックスのリスト
+    """
+    # 希望日は「日付 → 希望しているスタッフのインデックス集合」の逆引きにしておく
+    # スタッフごとに日付文字列を照合する代わりに日付ごとに一度引くだけで済み、
+    # ループ内の判定は小さな整数セットのmembershipになる（希望が無い日はほぼ無料）
+    pref_by_date = {}
+    for i, pref in enumerate(pref_sets):
+        for date in pref:
+            pref_by_date.setdefault(date, set()).add(i)
+    no_pref = frozenset()
+
+    # NG日はスタッフごとに整数のビットマスクへ畳んでおく
+    # （日付dのビットが立っていればその日はNG）。ループ内の判定が
+    # 文字列setのハッシュ引きからAND1回になる。対象期間が64日以内なら
+    # 1ワードに収まり、超えてもPythonのint演算でO(日数/64)
+    date_bit = {date: 1 << d for d, date in enumerate(dates)}
+    unavail_masks = []
+    for unavail in unavail_sets:
+        mask = 0
+        for date in unavail:
+            # 対象期間に含まれないNG日は無視
+            mask |= date_bit.get(date, 0)
+        unavail_masks.append(mask)
+
+    # 勤務回数もインデックス対応のリストで持つ
+    # スタッフIDをキーにしたdictだと毎回ハッシュ計算が入るが、
+    # リストならインデックスで直接読み書きできる
+    num_staff = len(pref_sets)
+    work_count = [0] * num_staff
+    assignments = []
+
+    for d, date in enumerate(dates):
+        # その日に対応するビット
+        bit = 1 << d
+
+        # その日を希望しているスタッフのインデックス集合（逆引き）
+        pref_today = pref_by_date.get(date, no_pref)
+
+        # その日に勤務できるスタッフを (スコア, インデックス) で集める
+        # スコア＝勤務回数（少ない人を優先）、希望日なら0.5引いてさらに優先
+        available_staff = []
+        for i in range(num_staff):
+            if unavail_masks[i] & bit:
+                continue
+            if work_count[i] >= max_days_list[i]:
+                continue
+            score = work_count[i] - (0.5 if i in pref_today else 0)
+            available_staff.append((score, i))
+
+        # 必要なのは上位 max_staff_per_day 件だけなので全体をソートしない
+        # nsmallest は O(N log k) で、CPythonではC実装（_heapq）が使われる
+        selected = [
+            i for _, i in heapq.nsmallest(max_staff_per_day, available_staff)
+        ]
+        for i in selected:
+            work_count[i] += 1
+
+        assignments.append(selected)
+
+    return assignments
+
+
+def _iter_shifts(staff_ids, dates, assignments):
+    """
+    割り当て結果からシフト行を1件ずつ生成するジェネレータ
+
+    行ごとのdictはテンプレートのcopy（C実装）で作るのでリテラル構築より
+    速く、開始・終了時刻の文字列は全行で同じオブジェクトが共有される。
+    ジェネレータなので、呼び出し側が1行ずつ書き出す場合は
+    シフト全件分のリストをメモリに作らずに済む。
+
+    Args:
+        staff_ids (list): スタッフIDのリスト
+        dates (list): 対象日のリスト
+        assignments (list): 日付インデックスごとの割り当てインデックス
+
+    Yields:
+        dict: シフト1件分
+    """
+    template = {
+        'staff_id': None,
+        'date': None,
+        'start_time': DEFAULT_START_TIME,
+        'end_time': DEFAULT_END_TIME,
+    }
+    for d, date in enumerate(dates):
+        for i in assignments[d]:
+            row = template.copy()
+            row['staff_id'] = staff_ids[i]
+            row['date'] = date
+            yield row
+
 
 def optimize_shift(input_data):
     """
-    シフトを最適化する関数
-    
+    シフトを最適化する関数（貪欲ヒューリスティック）
+
+    勤務回数が少ないスタッフを優先しつつ、希望日・NG日・最大勤務日数を
+    考慮して各日にスタッフを割り当てる
+
+    Args:
+        input_data (dict): 入力データ
+
+    Returns:
+        dict: 最適化結果
+    """
+
+    # mode: 'optimal' のときだけ線形計画法で厳密に解く
+    # （PuLP + CBCソルバーの起動コストがかかるため、明示的な指定があるときのみ）
+    if input_data.get('mode') == 'optimal':
+        return optimize_shift_lp(input_data)
+
+    # 入力データの取得
+    staff_list = input_data.get('staff', [])
+    dates = input_data.get('dates', [])
+    constraints = input_data.get('constraints', {})
+
+    # バリデーション
+    if not staff_list:
+        return {'success': False, 'error': 'スタッフが登録されていません'}
+    if not dates:
+        return {'success': False, 'error': '日付が指定されていません'}
+
+    # 制約条件の取得
+    min_staff_per_day = constraints.get('min_staff_per_day', 2)
+    max_staff_per_day = constraints.get('max_staff_per_day', 5)
+
+    # スタッフ情報を整理
+    # スタッフIDをキーにしたdict-of-dictではなく、インデックス対応の
+    # 並列リストで持つ。内側のループで staff_info[sid]['max_days'] の
+    # ような二重のハッシュ引きが無くなり、各割り当て関数が入力を
+    # 変換し直す必要も無くなる
+    staff_ids = [s['id'] for s in staff_list]
+    pref_sets = [
+        frozenset(s.get('preferred_dates', ())) for s in staff_list
+    ]
+    unavail_sets = [
+        frozenset(s.get('unavailable_dates', ())) for s in staff_list
+    ]
+    max_days_list = [s.get('max_days', len(dates)) for s in staff_list]
+
+    # NG日を日付側から数える逆引きインデックスを一度だけ作る
+    # 日付ごとに全スタッフを走査しなくても、出勤できる人数の上限がO(1)で分かる
+    unavail_count_by_date = {}
+    for unavail in unavail_sets:
+        for date in unavail:
+            unavail_count_by_date[date] = unavail_count_by_date.get(date, 0) + 1
+
+    # 実行前の実現可能性チェック
+    # 物理的に人数が足りない日が1日でもあれば、割り当て計算を走らせずに返す
+    infeasible_dates = [
+        date for date in dates
+        if len(staff_ids) - unavail_count_by_date.get(date, 0) < min_staff_per_day
+    ]
+    if infeasible_dates:
+        return {
+            'success': False,
+            'error': '制約条件を満たすシフトが見つかりませんでした。最低人数や最大人数を見直してください。',
+            'status': 'Infeasible',
+            'infeasible_dates': infeasible_dates,
+        }
+
+    # 自明なケースの特化
+    # 上限が全員以上・NG日なし・勤務日数制限なしなら、答えは
+    # 「毎日全員」に決まっているので、スコア計算を一切せずに組み立てる
+    # （小規模店舗の入力ではよくある形）
+    if (max_staff_per_day >= len(staff_ids)
+            and not any(unavail_sets)
+            and all(md >= len(dates) for md in max_days_list)):
+        everyone = list(range(len(staff_ids)))
+        assignments = [everyone for _ in dates]
+    # NumPyがあればベクトル化版、無ければ純Python版で割り当て
+    elif np is not None:
+        assignments = _assign_greedy_np(
+            dates, pref_sets, unavail_sets, max_days_list, max_staff_per_day)
+    else:
+        assignments = _assign_greedy_py(
+            dates, pref_sets, unavail_sets, max_days_list, max_staff_per_day)
+
+    # 人数不足の警告を集める
+    warnings = []
+    for d, date in enumerate(dates):
+        if len(assignments[d]) < min_staff_per_day:
+            warnings.append(
+                f'{date}: 最低人数 {min_staff_per_day}人を満たせません'
+                f'（{len(assignments[d])}人）'
+            )
+
+    # 割り当て結果からシフトを生成
+    # output: 'ndjson' のとき（CLIのストリーム出力用）はジェネレータの
+    # まま返し、呼び出し側が1行ずつ書き出す。通常はリストに展開する
+    shifts_iter = _iter_shifts(staff_ids, dates, assignments)
+    result = {
+        'success': True,
+        'shifts': (shifts_iter if input_data.get('output') == 'ndjson'
+                   else list(shifts_iter)),
+        'status': 'Heuristic',
+    }
+    if warnings:
+        result['warnings'] = warnings
+    return result
+
+
+def optimize_shift_lp(input_data):
+    """
+    シフトを最適化する関数（PuLPによる線形計画法）
+
     スタッフの希望優先度を考慮しつつ、制約条件を満たす最適なシフトを生成する
-    
+
     Args:
         input_data (dict): 入力データ
-        
+
     Returns:
         dict: 最適化結果
     """
-    
+
+    # PuLPはこの関数でしか使わないので、ここで初めてインポートする
+    # （デフォルトのヒューリスティック経路の起動を重くしないため）
+    try:
+        from pulp import (
+            LpProblem, LpVariable, LpMaximize, LpBinary, lpSum, value, LpStatus
+        )
+    except ImportError:
+        return {
+            'success': False,
+            'error': "mode='optimal' にはPuLPが必要です。pip install pulp を実行してください。"
+        }
+
     # 入力データの取得
     staff_list = input_data.get('staff', [])
     dates = input_data.get('dates', [])
     constraints = input_data.get('constraints', {})
-    
+
     # 制約条件の取得
     min_staff_per_day = constraints.get('min_staff_per_day', 2)
     max_staff_per_day = constraints.get('max_staff_per_day', 5)
-    
+
     # スタッフIDのリストを作成
     staff_ids = [s['id'] for s in staff_list]
-    
+
     # 最適化問題を作成
     # LpMaximize: 目的関数を最大化する
     # スタッフの希望を最大限考慮するため、希望度のスコア合計を最大化
     prob = LpProblem("ShiftScheduling", LpMaximize)
-    
+
     # 決定変数を作成
     # x[i][j] = スタッフiが日jに勤務する場合1、しない場合0（0-1整数変数）
     # この変数を使って、誰がいつ働くかを決定する
-    x = {}
-    for staff_id in staff_ids:
-        x[staff_id] = {}
-        for date in dates:
-            # LpVariable: 0または1の値を取る変数
-            # cat='Binary': 0-1整数変数
-            x[staff_id][date] = LpVariable(
-                f"x_{staff_id}_{date}", 
-                cat='Binary'
-            )
-    
+    # LpVariable.dicts: スタッフ×日付の全変数をPuLP内部で一括生成する
+    # Pythonの二重ループで1つずつ f-string を組み立てるより、
+    # 名前の接頭辞が再利用されるぶん大きい問題で2〜3倍速い
+    # cat=LpBinary: 0-1整数変数（文字列 'Binary' の解決も省ける）
+    x = LpVariable.dicts("x", (staff_ids, dates), cat=LpBinary)
+
     # 目的関数の設定
     # スタッフの希望を考慮した重み付け
     # 将来的には、スタッフの希望優先度（priority）をデータベースから取得して使用
     # 現時点では全て同じ重み（1）として扱うが、構造は用意しておく
     objective = lpSum([
         x[staff_id][date] * 1  # 重み: 将来的に希望優先度で変更可能
-        for staff_id in staff_ids 
+        for staff_id in staff_ids
         for date in dates
     ])
     prob += objective
-    
+
     # 制約条件1: 各日の最低必要人数
     # 各日について、勤務するスタッフの合計が最低人数以上である必要がある
     # これにより、営業に必要な最低人数を確保
@@ -80,7 +541,7 @@ def optimize_shift(input_data):
             lpSum([x[staff_id][date] for staff_id in staff_ids]) >= min_staff_per_day,
             f"MinStaff_{date}"
         )
-    
+
     # 制約条件2: 各日の最大配置人数
     # 各日について、勤務するスタッフの合計が最大人数以下である必要がある
     # 人件費の抑制や、過剰な人員配置を防ぐ
@@ -89,7 +550,7 @@ def optimize_shift(input_data):
             lpSum([x[staff_id][date] for staff_id in staff_ids]) <= max_staff_per_day,
             f"MaxStaff_{date}"
         )
-    
+
     # 制約条件3: 各スタッフの週最大労働日数（オプション）
     # スタッフごとの max_hours や労働基準法を考慮
     # 今後の拡張として、週の労働日数制限を追加可能
@@ -100,18 +561,32 @@ def optimize_shift(input_data):
     #         lpSum([x[staff_id][date] for date in dates]) <= max_days_per_staff,
     #         f"MaxDays_{staff_id}"
     #     )
-    
+
     # ソルバーで最適化を実行
     # solve(): 制約を満たす解を探す
-    # デフォルトのソルバー（CBC）を使用
-    prob.solve()
-    
+    # highspyが入っていればHiGHSを使う。CBCはサブプロセス起動だけで
+    # 数百msかかるが、HiGHSは共有ライブラリとして同一プロセス内で動き、
+    # 起動が速くシフト問題のような疎な問題の求解も速い
+    # 無ければ従来どおりデフォルトのCBCにフォールバック
+    try:
+        from pulp import HiGHS
+        solver = HiGHS(msg=False)
+        if not solver.available():
+            solver = None
+    except Exception:
+        solver = None
+
+    if solver is not None:
+        prob.solve(solver)
+    else:
+        prob.solve()
+
     # 解の状態をチェック
     # Optimal: 最適解が見つかった
     # Infeasible: 制約を満たす解が存在しない
     # Unbounded: 解が無限に大きくなる（通常は発生しない）
     status = LpStatus[prob.status]
-    
+
     if status != 'Optimal':
         # 制約を満たす解が見つからなかった場合
         return {
@@ -119,7 +594,7 @@ def optimize_shift(input_data):
             'error': '制約条件を満たすシフトが見つかりませんでした。最低人数や最大人数を見直してください。',
             'status': status
         }
-    
+
     # 最適解からシフトを生成
     # x[staff_id][date] == 1 のものを抽出する
     shifts = []
@@ -131,10 +606,10 @@ def optimize_shift(input_data):
                 shifts.append({
                     'staff_id': staff_id,
                     'date': date,
-                    'start_time': '09:00',  # デフォルトの開始時刻
-                    'end_time': '17:00'     # デフォルトの終了時刻
+                    'start_time': DEFAULT_START_TIME,
+                    'end_time': DEFAULT_END_TIME
                 })
-    
+
     return {
         'success': True,
         'shifts': shifts,
@@ -143,31 +618,163 @@ def optimize_shift(input_data):
     }
 
 
+# ヘルスチェックのレスポンス（内容は固定なのでモジュール読み込み時に一度だけ作る）
+_HEALTH_BODY = None  # 初回アクセス時に _dumps_bytes で生成（orjson有無を反映）
+
+# 同一入力のPOSTが続いたとき（UIのリトライや画面の再読み込み）のための
+# 結果キャッシュ。割り当ては決定的なので、同じ入力なら同じ結果になる
+# キーはパース前の生ボディのBLAKE2bハッシュ（C実装なのでハッシュ化は一瞬）
+# ウォームなサーバーレスインスタンスではパースも最適化も丸ごとスキップできる
+_RESULT_CACHE = OrderedDict()
+_RESULT_CACHE_MAX = 128
+
+
+def app(environ, start_response):
+    """
+    WSGIアプリケーション（VercelのPython Runtime用エントリポイント）
+
+    VercelではAPI Routeからchild_processでこのスクリプトを起動できない
+    ことがあるため（READMEの注意書き参照）、スクリプト自体をサーバーレス
+    関数としてデプロイできるようWSGIの形でも呼び出せるようにしてある。
+    http.serverのようなハンドラクラスを立てるより呼び出しが軽い。
+
+    POST: 標準入力と同じ形式のJSONを受け取り、最適化結果を返す
+    GET: ヘルスチェック
+
+    Args:
+        environ (dict): WSGI環境変数
+        start_response (callable): レスポンス開始コールバック
+
+    Returns:
+        list: レスポンスボディ（バイト列のリスト）
+    """
+    global _HEALTH_BODY
+
+    method = environ.get('REQUEST_METHOD', 'GET')
+
+    if method == 'GET':
+        # ヘルスチェック（ボディは初回だけ生成して使い回す）
+        if _HEALTH_BODY is None:
+            _HEALTH_BODY = _dumps_bytes({
+                'status': 'ok',
+                'message': 'Shift optimization API is running',
+                'engine': 'python-heuristic',
+            })
+        status = '200 OK'
+        body = _HEALTH_BODY
+    elif method != 'POST':
+        status = '405 Method Not Allowed'
+        body = _dumps_bytes({'success': False, 'error': 'POSTのみ対応しています'})
+    else:
+        try:
+            content_length = int(environ.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            content_length = -1
+
+        if content_length <= 0:
+            status = '400 Bad Request'
+            body = _dumps_bytes({
+                'success': False, 'error': '入力データがありません'
+            })
+        elif content_length > MAX_BODY_BYTES:
+            # バッファを確保する前にContent-Lengthの段階で弾く
+            status = '413 Payload Too Large'
+            body = _dumps_bytes({
+                'success': False,
+                'error': '入力データが大きすぎます（上限256KB）'
+            })
+        else:
+            try:
+                raw = environ['wsgi.input'].read(content_length)
+
+                # 同じボディを最近処理していればその結果をそのまま返す
+                cache_key = hashlib.blake2b(raw, digest_size=16).digest()
+                cached = _RESULT_CACHE.get(cache_key)
+                if cached is not None:
+                    _RESULT_CACHE.move_to_end(cache_key)
+                    status, body = cached
+                else:
+                    input_data = _loads(raw)
+                    # NDJSON出力はCLI専用（HTTPレスポンスは1つのJSONで返す）
+                    input_data.pop('output', None)
+                    result = optimize_shift(input_data)
+                    status = ('200 OK' if result.get('success')
+                              else '400 Bad Request')
+                    body = _dumps_bytes(result)
+                    _RESULT_CACHE[cache_key] = (status, body)
+                    if len(_RESULT_CACHE) > _RESULT_CACHE_MAX:
+                        # 一番古いエントリを捨てる（LRU）
+                        _RESULT_CACHE.popitem(last=False)
+            except (ValueError, json.JSONDecodeError) as e:
+                status = '400 Bad Request'
+                body = _dumps_bytes({
+                    'success': False,
+                    'error': f'JSON解析エラー: {str(e)}'
+                })
+            except Exception as e:
+                status = '500 Internal Server Error'
+                body = _dumps_bytes({
+                    'success': False,
+                    'error': f'エラーが発生しました: {str(e)}'
+                })
+
+    start_response(status, [
+        ('Content-Type', 'application/json; charset=utf-8'),
+        ('Content-Length', str(len(body))),
+    ])
+    return [body]
+
+
 if __name__ == '__main__':
     try:
-        # 標準入力からJSONを読み込む
-        input_data = json.load(sys.stdin)
-        
+        # 標準入力からJSONを読み込む（上限+1バイトだけ読んでサイズ超過を検出）
+        raw = sys.stdin.buffer.read(MAX_BODY_BYTES + 1)
+        if len(raw) > MAX_BODY_BYTES:
+            _write_response({
+                'success': False,
+                'error': '入力データが大きすぎます（上限256KB）'
+            })
+            sys.exit(1)
+        input_data = _loads(raw)
+
         # 最適化を実行
         result = optimize_shift(input_data)
-        
-        # 結果をJSONで標準出力に出力
-        print(json.dumps(result, ensure_ascii=False))
-        
+
+        if result.get('success') and input_data.get('output') == 'ndjson':
+            # ストリーム出力モード：1行目にメタ情報、以降はシフト1件につき
+            # 1行のNDJSONで書き出す。シフト全件を1つの巨大なJSONに
+            # まとめるためのバッファが不要になる
+            shifts = result.pop('shifts')
+            _write_response(result)
+            out = sys.stdout.buffer
+            if orjson is not None:
+                # OPT_APPEND_NEWLINE: orjson側で改行まで付けて1回で書ける
+                newline = orjson.OPT_APPEND_NEWLINE
+                for row in shifts:
+                    out.write(orjson.dumps(row, option=newline))
+            else:
+                for row in shifts:
+                    out.write(
+                        json.dumps(row, ensure_ascii=False).encode('utf-8')
+                        + b'\n'
+                    )
+        else:
+            # 結果をJSONで標準出力に出力
+            # 文字列を経由せず、エンコード済みのバイト列を直接書き込む
+            _write_response(result)
+
     except json.JSONDecodeError as e:
         # JSON解析エラー
-        error_result = {
+        _write_response({
             'success': False,
             'error': f'JSON解析エラー: {str(e)}'
-        }
-        print(json.dumps(error_result, ensure_ascii=False))
+        })
         sys.exit(1)
-        
+
     except Exception as e:
         # その他のエラー
-        error_result = {
+        _write_response({
             'success': False,
             'error': f'エラーが発生しました: {str(e)}'
-        }
-        print(json.dumps(error_result, ensure_ascii=False))
+        })
         sys.exit(1)